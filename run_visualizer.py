@@ -1,12 +1,14 @@
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import csv
 import datetime
-import glob
+import functools
+import importlib.util
+import re
 import textwrap
 import subprocess
 import sys
+import zoneinfo
+from concurrent.futures import ProcessPoolExecutor
 
 # --- Global Configuration ---
 
@@ -26,32 +28,77 @@ CHANNELS = {
 }
 SIGNALS_TO_PLOT = list(CHANNELS.keys())
 
-# 3. Plot Styling
+# 3. Timezone
+#    Data and schedule times are shown in the recording site's local time.
+#    Resolved lazily by eastern_tz(), after install_packages() has had a chance to
+#    install tzdata on systems without a timezone database (e.g. Windows).
+EASTERN_TIMEZONE = 'America/New_York'
+
+# 4. Plot Styling
 FIGURE_SIZE = (22, 7)
+PLOT_DPI = 150
 ANNOTATION_BACKGROUND_COLOR = 'grey'
 ANNOTATION_ALPHA = 0.2
+ANNOTATION_BOX_STYLE = dict(boxstyle="round,pad=0.4", fc="white", ec="gray", lw=0.5, zorder=2)
+ANNOTATION_ARROW_STYLE = dict(arrowstyle="-", linestyle=(0, (5, 10)), color='gray', shrinkA=5, zorder=1)
+# Keep matplotlib's default (conservative) path simplification: downsample() already
+# bounds the vertex count, and raising the threshold streaks dense signals. Long
+# paths are split into chunks so Agg rasterizes them quickly.
+PLOT_RC_PARAMS = {
+    'path.simplify': True,
+    'agg.path.chunksize': 10000,
+}
+
+# 5. Caching
+#    Parsed signals are saved as '<file>.csv.parquet' next to each CSV and reused
+#    on later runs as long as the CSV's size and modification time are unchanged.
+USE_PARQUET_CACHE = True
+# Schema metadata entry holding '<size>:<mtime_ns>' of the source CSV
+PARQUET_CACHE_KEY = b'emotibit_source_csv'
+
+# EmotiBit file names start with the recording date, e.g. '2024-03-01_10-15-00-123456_AX.csv'
+_FILENAME_DATE_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})_')
 
 # --- Core Functions ---
+# pandas, numpy and matplotlib are imported inside the functions that use them, so
+# install_packages() can run before they are needed and importing this module
+# stays cheap.
 
 def install_packages():
     """Checks and installs required packages."""
-    required_packages = ['pandas', 'matplotlib', 'openpyxl']
+    required_packages = ['pandas', 'matplotlib', 'openpyxl', 'pyarrow', 'tzdata']
     for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
+        # find_spec checks availability without paying for the import itself
+        if importlib.util.find_spec(package) is None:
             print(f"Installing {package}...")
             subprocess.check_call([sys.executable, "-m", "pip", "install", package])
     print("All required packages are installed.")
 
-def load_emotibit_data(folder_path, signals_to_plot):
-    """Loads and processes EmotiBit CSV files from a specified folder."""
+@functools.lru_cache(maxsize=None)
+def eastern_tz():
+    """Returns the recording site's timezone, looked up once per process."""
+    return zoneinfo.ZoneInfo(EASTERN_TIMEZONE)
+
+def load_emotibit_data(folder_path, signals_to_plot, file_names=None):
+    """
+    Loads and processes EmotiBit CSV files from a specified folder.
+    `file_names` may hold an existing listing of the folder to avoid rescanning it.
+    """
+    import pandas as pd
+
     print(f"--- Starting EmotiBit Data Loading from '{folder_path}' ---")
     dataframes = {}
     experiment_date_str = None
     
     try:
-        all_files = glob.glob(os.path.join(folder_path, '*.csv'))
+        # Scan the folder once and index the files by signal suffix, instead of
+        # globbing the same directory again for every signal type.
+        if file_names is None:
+            file_names = [entry.name for entry in os.scandir(folder_path)]
+        all_files = sorted(
+            name for name in file_names
+            if name.endswith('.csv') and not name.startswith('.')
+        )
         if not all_files:
             print(f"Error: No CSV files found in '{folder_path}'. Please check the path.")
             return {}, None
@@ -59,41 +106,93 @@ def load_emotibit_data(folder_path, signals_to_plot):
         print(f"Error: Could not access folder '{folder_path}'. {e}")
         return {}, None
 
-    for file_path in all_files:
-        basename = os.path.basename(file_path)
-        try:
-            date_part = basename.split('_')[0]
-            datetime.datetime.strptime(date_part, '%Y-%m-%d')
-            experiment_date_str = date_part.replace('-', '')
+    files_by_signal = {}
+    for basename in all_files:
+        if '_' in basename:
+            files_by_signal.setdefault(basename.rsplit('_', 1)[-1][:-len('.csv')], basename)
+
+    for basename in all_files:
+        match = _FILENAME_DATE_RE.match(basename)
+        if match:
+            experiment_date_str = match.group(1).replace('-', '')
             print(f"Successfully extracted experiment date: {experiment_date_str} from filename '{basename}'")
             break
-        except (ValueError, IndexError):
-            continue
     
     if not experiment_date_str:
         print("Error: Could not parse experiment date from any filename.")
         return {}, None
 
     for signal_type in signals_to_plot:
-        file_pattern = os.path.join(folder_path, f"*_{signal_type}.csv")
-        found_files = glob.glob(file_pattern)
-        if not found_files:
+        basename = files_by_signal.get(signal_type)
+        if basename is None:
             continue
-        file_path = found_files[0]
+        file_path = os.path.join(folder_path, basename)
+        cache_path = file_path + '.parquet'
+        if USE_PARQUET_CACHE:
+            # The cache records the size and mtime of the CSV it was built from, so a
+            # replaced CSV is re-parsed even if it was copied with its old timestamps.
+            source_stat = os.stat(file_path)
+            cache_key = f"{source_stat.st_size}:{source_stat.st_mtime_ns}".encode()
+            if os.path.exists(cache_path):
+                try:
+                    import pyarrow.parquet as pq
+
+                    # Only the footer is read to validate the key; rows are loaded on a hit
+                    metadata = pq.read_schema(cache_path).metadata or {}
+                    if metadata.get(PARQUET_CACHE_KEY) == cache_key:
+                        dataframes[signal_type] = pd.read_parquet(cache_path, columns=['est_time', 'value'])
+                        continue
+                except Exception as e:
+                    print(f"  - Warning: Ignoring unreadable cache '{os.path.basename(cache_path)}': {e}")
         try:
-            df = pd.read_csv(file_path)
-            if 'LocalTimestamp' not in df.columns or df.shape[1] < 2:
+            # Peek at the header so only the timestamp and signal columns are parsed.
+            columns = pd.read_csv(file_path, nrows=0).columns.tolist()
+            if 'LocalTimestamp' not in columns or len(columns) < 2:
                 continue
-            signal_column_name = df.columns[-1]
-            df['est_time'] = pd.to_datetime(df['LocalTimestamp'], unit='s').dt.tz_localize('UTC').dt.tz_convert('US/Eastern')
+            signal_column_name = columns[-1]
+            df = pd.read_csv(
+                file_path,
+                usecols=['LocalTimestamp', signal_column_name],
+                dtype={'LocalTimestamp': 'float64', signal_column_name: 'float32'},
+                engine='c'
+            )
+            df['est_time'] = pd.to_datetime(df['LocalTimestamp'], unit='s', utc=True).dt.tz_convert(eastern_tz())
             df.rename(columns={signal_column_name: 'value'}, inplace=True)
-            dataframes[signal_type] = df[['est_time', 'value']]
+            # Single precision is plenty for a plotted signal and halves the data
+            # pushed through the renderer.
+            df['value'] = df['value'].astype('float32')
+            df = df[['est_time', 'value']]
+            dataframes[signal_type] = df
         except Exception as e:
             print(f"  - Error processing file '{os.path.basename(file_path)}': {e}")
+            continue
+        if USE_PARQUET_CACHE:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                table = table.replace_schema_metadata({**table.schema.metadata, PARQUET_CACHE_KEY: cache_key})
+                pq.write_table(table, cache_path, compression='zstd')
+            except Exception as e:
+                print(f"  - Warning: Could not write cache '{os.path.basename(cache_path)}': {e}")
             
     print(f"--- EmotiBit Data Loading Complete. Loaded {len(dataframes)} signals. ---\n")
     return dataframes, experiment_date_str
 
+@functools.lru_cache(maxsize=None)
+def parse_time(time_str, date_str, is_pm):
+    """Converts a schedule time such as '10:15', '10:15:30' or '2:05 pm' into an Eastern datetime on the given date."""
+    # Clean the string by removing AM/PM suffixes, case-insensitively
+    cleaned_time_str = time_str.lower().replace('am', '').replace('pm', '').strip()
+    # Times without seconds (e.g., '11:15') get ':00' so a single format covers both
+    if cleaned_time_str.count(':') == 1:
+        cleaned_time_str += ':00'
+    dt_naive = datetime.datetime.strptime(f"{date_str} {cleaned_time_str}", '%Y%m%d %H:%M:%S')
+    if is_pm and 1 <= dt_naive.hour <= 11:
+        dt_naive += datetime.timedelta(hours=12)
+    return dt_naive.replace(tzinfo=eastern_tz())
+
 def load_music_schedule(file_path, experiment_date_str, data_folder_path):
     """
     Loads the schedule from a CSV file, includes the new 'Score' column,
@@ -104,15 +203,16 @@ def load_music_schedule(file_path, experiment_date_str, data_folder_path):
         print(f"Info: Schedule file not found. Plots will not have annotations.")
         return None
     try:
-        # Read from CSV, now including the 'score' column
-        df_schedule = pd.read_csv(
-            file_path, 
-            header=0, 
-            usecols=[0, 1, 2, 3], 
-            names=['time_str', 'song_artist', 'score', 'observation']
-        )
-        df_schedule.dropna(how='all', inplace=True)
-        if df_schedule.empty:
+        # The schedule is only a few dozen rows, so the stdlib reader is much cheaper
+        # than pandas. Keep the first four columns (time, song, score, observation),
+        # padding short rows, and skip the header and fully blank rows.
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            rows = []
+            for row_number, row in enumerate(csv.reader(f), start=1):
+                cells = [cell.strip() for cell in (row + [''] * 4)[:4]]
+                if row_number > 1 and any(cells):
+                    rows.append((row_number, cells))
+        if not rows:
             return None
     except Exception as e:
         print(f"Error: Failed to read schedule CSV file: {e}")
@@ -126,34 +226,13 @@ def load_music_schedule(file_path, experiment_date_str, data_folder_path):
     first_song_start_time = None
     final_end_time = None
 
-    def parse_time(time_str, date_str, is_pm):
-         # Clean the string by removing AM/PM suffixes, case-insensitively
-        cleaned_time_str = time_str.lower().replace('am', '').replace('pm', '').strip()
-        try:
-            # First, try to parse with seconds (e.g., '10:15:30')
-            time_obj = datetime.datetime.strptime(cleaned_time_str, '%H:%M:%S').time()
-        except ValueError:
-            # If that fails, try to parse without seconds (e.g., '11:15')
-            time_obj = datetime.datetime.strptime(cleaned_time_str, '%H:%M').time()
-        
-        hour = time_obj.hour
-        if is_pm and 1 <= hour <= 11:
-            hour += 12
-        full_datetime_str = f"{date_str} {hour:02d}:{time_obj.minute:02d}:{time_obj.second:02d}"
-        dt_naive = datetime.datetime.strptime(full_datetime_str, '%Y%m%d %H:%M:%S')
-        return pd.Timestamp(dt_naive, tz='US/Eastern')
-
     all_events = []
-    for index, row in df_schedule.iterrows():
+    for row_number, (time_str, song_artist, score, observation) in rows:
         try:
-            current_row_time = parse_time(str(row['time_str']).strip(), experiment_date_str, is_afternoon)
-            # Handle blank cells for song_artist
-            song_artist = str(row['song_artist']).strip() if pd.notna(row['song_artist']) else ""
-            score = str(row['score']).strip() if pd.notna(row['score']) else ""
-            observation = str(row['observation']).strip() if pd.notna(row['observation']) else ""
+            current_row_time = parse_time(time_str, experiment_date_str, is_afternoon)
             all_events.append({'time': current_row_time, 'song': song_artist, 'score': score, 'obs': observation})
-        except (ValueError, TypeError) as e:
-            print(f"Warning: Could not parse time '{row['time_str']}' on Excel row {index+2}. Skipping. Error: {e}")
+        except ValueError as e:
+            print(f"Warning: Could not parse time '{time_str}' on Excel row {row_number}. Skipping. Error: {e}")
             continue
     
     if not all_events:
@@ -195,9 +274,49 @@ def load_music_schedule(file_path, experiment_date_str, data_folder_path):
 
     return {'annotations': annotations, 'music_start': first_song_start_time, 'music_end': final_end_time}
 
-def plot_and_save_signal(signal_name, df, schedule_data, channel_map, output_folder):
-    """Plots a single signal with annotations for each time point and saves the figure."""
-    if df.empty or df['est_time'].isnull().all():
+def downsample(df, n_buckets):
+    """
+    Reduces a signal to at most four points per bucket (M4: first, last, min and
+    max), splitting its time range into `n_buckets` equal intervals. With one
+    bucket per pixel column of the axes the line keeps its drawn extent in every
+    column while drawing far fewer segments (antialiased edges may shade slightly
+    differently). NaN gaps are kept, but never replace a bucket's extremes.
+    """
+    import numpy as np
+
+    if len(df) <= 4 * n_buckets:
+        return df
+
+    values = df['value'].to_numpy()
+    times = df['est_time'].astype('int64').to_numpy()
+    bucket_bounds = np.linspace(times[0], times[-1], n_buckets + 1)
+    # The running maximum keeps the edges ordered even if timestamps briefly step back
+    edges = np.maximum.accumulate(np.searchsorted(times, bucket_bounds[1:-1], side='left'))
+    edges = np.concatenate(([0], edges, [len(df)]))
+    keep = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop <= start:
+            continue
+        keep.extend((start, stop - 1))
+        bucket = values[start:stop]
+        if np.isnan(bucket).all():
+            continue
+        keep.extend((start + np.nanargmin(bucket), start + np.nanargmax(bucket)))
+    return df.iloc[np.unique(np.array(keep, dtype=np.int64))]
+
+def plot_and_save_signal(ax, signal_name, df, schedule_data, channel_map, output_folder):
+    """
+    Plots a single signal with annotations for each time point onto the shared
+    axes and saves the figure.
+    """
+    import pandas as pd
+    import matplotlib.dates as mdates
+
+    if df.empty:
+        return
+    # Samples are stored in acquisition order, so the ends of the column bound the data
+    min_time_data, max_time_data = df['est_time'].iat[0], df['est_time'].iat[-1]
+    if pd.isna(min_time_data) or pd.isna(max_time_data):
         return
 
     annotations = schedule_data.get('annotations', []) if schedule_data else []
@@ -209,32 +328,39 @@ def plot_and_save_signal(signal_name, df, schedule_data, channel_map, output_fol
     extra_height_per_line = 0.3
     dynamic_height = base_height + (total_annotation_lines * extra_height_per_line)
     
-    fig, ax = plt.subplots(figsize=(FIGURE_SIZE[0], dynamic_height))
-    ax.plot(df['est_time'], df['value'], label=signal_name, color='royalblue', linewidth=1.5)
-    min_time_data, max_time_data = df['est_time'].min(), df['est_time'].max()
+    # The figure is reused across signals; reset the axes and resize for this plot.
+    fig = ax.figure
+    ax.clear()
+    fig.set_size_inches(FIGURE_SIZE[0], dynamic_height)
+    # One M4 bucket per pixel column spanned by the axes in the saved image
+    axes_width_px = int(round(ax.get_position().width * fig.get_figwidth() * PLOT_DPI))
+    df = downsample(df, axes_width_px)
+    ax.plot(df['est_time'], df['value'], label=signal_name, color='royalblue', linewidth=1.5, solid_joinstyle='round')
     ax.set_xlim(min_time_data, max_time_data)
     
     # Draw a single gray background for the entire music session
     if music_start and music_end:
         ax.axvspan(music_start, music_end, color=ANNOTATION_BACKGROUND_COLOR, alpha=ANNOTATION_ALPHA, zorder=0)
     
+    # Annotations arrive already clipped to this signal's time range
     stagger_level = 0
     y_level_start, y_level_step = -0.15, -0.08
-    for annotation in annotations:
-        time_point = annotation['time']
+    # x in data coordinates, y in axes fraction; built once and shared by every annotation.
+    # A transform object bypasses matplotlib's date handling, so the times are
+    # converted to matplotlib date numbers up front.
+    data_x_axes_y = ax.get_xaxis_transform()
+    time_points = mdates.date2num([annotation['time'] for annotation in annotations])
+    for annotation, time_point in zip(annotations, time_points):
         annotation_text = annotation['text']
         
-        if not (min_time_data <= time_point <= max_time_data):
-            continue
-        
         y_level_for_text = y_level_start + (stagger_level * y_level_step)
         
         ax.annotate(
-            annotation_text, xy=(time_point, 0), xycoords=('data', 'axes fraction'),
-            xytext=(time_point, y_level_for_text), textcoords=('data', 'axes fraction'),
+            annotation_text, xy=(time_point, 0), xycoords=data_x_axes_y,
+            xytext=(time_point, y_level_for_text), textcoords=data_x_axes_y,
             ha='center', va='top', fontsize=10,
-            bbox=dict(boxstyle="round,pad=0.4", fc="white", ec="gray", lw=0.5, zorder=2),
-            arrowprops=dict(arrowstyle="-", linestyle=(0, (5, 10)), color='gray', shrinkA=5, zorder=1)
+            bbox=ANNOTATION_BOX_STYLE, arrowprops=ANNOTATION_ARROW_STYLE,
+            annotation_clip=False
         )
         stagger_level += 1
 
@@ -244,35 +370,59 @@ def plot_and_save_signal(signal_name, df, schedule_data, channel_map, output_fol
     ax.set_ylabel('Value', fontsize=12)
     ax.grid(True, axis='y', which='major', linestyle=':', color='gray', linewidth=0.8, alpha=0.7)
     ax.legend(loc='upper left')
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S', tz='US/Eastern'))
-    fig.autofmt_xdate()
+    # Cap the tick count and slant the labels directly instead of fig.autofmt_xdate(),
+    # which also re-lays out the whole figure.
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator(tz=eastern_tz(), maxticks=8))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S', tz=eastern_tz()))
+    for label in ax.get_xticklabels():
+        label.set_rotation(30)
+        label.set_horizontalalignment('right')
     
     output_filename = f"{signal_name}_plot.png"
     full_output_path = os.path.join(output_folder, output_filename)
-    fig.savefig(full_output_path, dpi=150, bbox_inches='tight', pad_inches=0.1)
+    # Compute the tight bounding box on the canvas's cached renderer; passing it
+    # explicitly stops savefig from building a second, full-size renderer for layout.
+    bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(0.1)
+    fig.canvas.print_figure(full_output_path, dpi=PLOT_DPI, bbox_inches=bbox)
     print(f"  - Plot saved to: {full_output_path}")
-    plt.close(fig)
 
 # --- Outer Wrapper and Main Loop ---
 
 def process_folder(folder_path):
     """Main processing logic for a single data folder."""
+    import numpy as np
+    import pandas as pd
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
     print(f"\n{'='*80}\nProcessing folder: {folder_path}\n{'='*80}")
     
     emotibit_data_path = folder_path
-    music_schedule_path = glob.glob(os.path.join(folder_path, '* Combined Observations.csv'))[0]
     output_folder_path = os.path.join(folder_path, 'plots')
-    
-    if not os.path.isdir(emotibit_data_path):
-        print(f"Error: 'emotibit_data' subfolder not found in {folder_path}. Skipping.")
+
+    # A single listing of the folder serves both the schedule lookup and the
+    # EmotiBit file discovery.
+    try:
+        entries = list(os.scandir(emotibit_data_path))
+    except OSError as e:
+        print(f"Error: Could not read data folder '{folder_path}'. Skipping. {e}")
         return
-    if not os.path.exists(music_schedule_path):
-        print(f"Error: 'music.xlsx' not found in {folder_path}. Skipping.")
+    # Like glob, skip hidden files (e.g. macOS '._*' sidecars) and pick deterministically
+    schedule_candidates = sorted(
+        entry.path for entry in entries
+        if entry.name.endswith(' Combined Observations.csv') and not entry.name.startswith('.')
+    )
+    music_schedule_path = schedule_candidates[0] if schedule_candidates else None
+    if music_schedule_path is None:
+        print(f"Error: '* Combined Observations.csv' not found in {folder_path}. Skipping.")
         return
         
     os.makedirs(output_folder_path, exist_ok=True)
     
-    emotibit_data, date_str = load_emotibit_data(emotibit_data_path, SIGNALS_TO_PLOT)
+    emotibit_data, date_str = load_emotibit_data(
+        emotibit_data_path, SIGNALS_TO_PLOT, file_names=[entry.name for entry in entries]
+    )
     if not date_str:
         print("Could not determine date. Aborting processing for this folder.")
         return
@@ -284,8 +434,26 @@ def process_folder(folder_path):
         return
 
     print(f"\n--- Generating and Saving {len(emotibit_data)} Plots to '{output_folder_path}' ---\n")
+    # Build one figure for the folder and redraw it for each signal.
+    matplotlib.rcParams.update(PLOT_RC_PARAMS)
+    fig = Figure(figsize=FIGURE_SIZE)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    # Leave room below the axes for the slanted time labels (set once, as the
+    # figure is reused for every signal)
+    fig.subplots_adjust(bottom=0.2)
+
+    # Sort the annotations once so the ones inside each signal's time range form a
+    # contiguous slice that can be found by binary search.
+    annotations = sorted(schedule_data['annotations'], key=lambda a: a['time']) if schedule_data else []
+    annotation_times = np.array([pd.Timestamp(a['time']).value for a in annotations], dtype=np.int64)
     for signal, df in emotibit_data.items():
-        plot_and_save_signal(signal, df, schedule_data, CHANNELS, output_folder_path)
+        signal_schedule = schedule_data
+        if schedule_data and not df.empty:
+            start = np.searchsorted(annotation_times, df['est_time'].iloc[0].value, side='left')
+            stop = np.searchsorted(annotation_times, df['est_time'].iloc[-1].value, side='right')
+            signal_schedule = dict(schedule_data, annotations=annotations[start:stop])
+        plot_and_save_signal(ax, signal, df, signal_schedule, CHANNELS, output_folder_path)
     print("\n--- Finished processing folder ---")
 
 
@@ -302,6 +470,11 @@ if __name__ == "__main__":
             print(f"No data folders found inside '{ROOT_DATASET_FOLDER}'.")
         else:
             print(f"Found {len(subfolders)} folders to process.")
-            for folder in subfolders:
-                process_folder(folder)
+            # Folders are independent, so process them in parallel, one per worker.
+            # Workers inherit this environment; keeping numeric libraries
+            # single-threaded stops them from oversubscribing the CPU.
+            os.environ.setdefault('OMP_NUM_THREADS', '1')
+            max_workers = min(len(subfolders), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(process_folder, subfolders))
             print(f"\n{'='*80}\nBatch processing complete.\n{'='*80}")